@@ -0,0 +1,51 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+from .views import (
+    IngredientViewSet, RecipieViewSet, TagViewSet, UserSubscribeViewSet,
+    me as sync_me
+)
+
+
+def async_view(view):
+
+    def run(request, *args, **kwargs):
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+        finally:
+            connections.close_all()
+
+    run = sync_to_async(run, thread_sensitive=False)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(request, *args, **kwargs)
+
+    return wrapper
+
+
+def async_action_view(viewset, basename, name):
+    action = getattr(viewset, name)
+    return async_view(viewset.as_view(
+        dict(action.mapping), basename=basename, detail=action.detail,
+        **action.kwargs
+    ))
+
+
+def async_list_view(viewset, basename):
+    return async_view(viewset.as_view(
+        {'get': 'list'}, basename=basename, detail=False, suffix='List'
+    ))
+
+
+favorite = async_action_view(RecipieViewSet, 'recipes', 'favorite')
+shopping_cart = async_action_view(RecipieViewSet, 'recipes', 'shopping_cart')
+subscribe = async_view(UserSubscribeViewSet.as_view())
+me = async_view(sync_me)
+tags = async_list_view(TagViewSet, 'tags')
+ingredients = async_list_view(IngredientViewSet, 'ingredients')
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from rest_framework.authentication import TokenAuthentication
+
+from .caching import TOKEN_CACHE_TIMEOUT, get_token_cache_key
+
+SENSITIVE_USER_FIELDS = ('password',)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        cache_key = get_token_cache_key(key)
+        fields = cache.get(cache_key)
+        if fields is not None:
+            user = self.load_user(fields)
+            return user, self.get_model()(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, self.dump_user(user), TOKEN_CACHE_TIMEOUT)
+        return user, token
+
+    def dump_user(self, user):
+        return {
+            field.attname: field.get_prep_value(field.value_from_object(user))
+            for field in user._meta.concrete_fields
+            if field.attname not in SENSITIVE_USER_FIELDS
+        }
+
+    def load_user(self, fields):
+        model = get_user_model()
+        return model.from_db(
+            router.db_for_read(model), list(fields), list(fields.values())
+        )
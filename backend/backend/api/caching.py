@@ -0,0 +1,198 @@
+import hashlib
+import time
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+from recipes.models import Tag
+from .renderers import ORJSONRenderer
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+CATALOG_MAX_AGE = 60
+RECIPE_LIST_VERSION_KEY = 'recipes:list:version'
+RECIPE_RESPONSE_TIMEOUT = 60 * 10
+RESPONSE_CACHE_STATS_KEYS = {
+    'hits': 'recipes:cache:hits',
+    'misses': 'recipes:cache:misses',
+}
+TOKEN_CACHE_TIMEOUT = 60
+TAG_IDS_TTL = 300
+
+
+_catalog_version = uuid.uuid4().hex
+
+
+def get_catalog_version():
+    global _catalog_version
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        return _catalog_version
+    _catalog_version = version
+    return version
+
+
+def bump_catalog_version():
+    global _catalog_version
+    _catalog_version = uuid.uuid4().hex
+    cache.set(CATALOG_VERSION_KEY, _catalog_version, None)
+
+
+_tag_ids = (None, None, {})
+
+
+def get_tag_ids():
+    global _tag_ids
+    version = get_catalog_version()
+    if (_tag_ids[0] != version
+            or time.monotonic() - _tag_ids[1] > TAG_IDS_TTL):
+        _tag_ids = (
+            version, time.monotonic(),
+            dict(Tag.objects.values_list('slug', 'id'))
+        )
+    return _tag_ids[2]
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
+
+
+def get_recipe_version_key(recipe_id):
+    return f'recipes:{recipe_id}:version'
+
+
+def get_versions(keys):
+    versions = cache.get_many(keys)
+    missing = {
+        key: uuid.uuid4().hex for key in keys if key not in versions
+    }
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return ':'.join(versions[key] for key in keys)
+
+
+def invalidate_recipe_responses(recipe_ids=()):
+    keys = [RECIPE_LIST_VERSION_KEY]
+    keys.extend(get_recipe_version_key(pk) for pk in recipe_ids)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def get_token_cache_key(key):
+    return 'auth:token-user:{}'.format(
+        hashlib.sha256(key.encode()).hexdigest()
+    )
+
+
+def invalidate_tokens(keys):
+    cache_keys = [get_token_cache_key(key) for key in keys]
+    if cache_keys:
+        transaction.on_commit(lambda: cache.delete_many(cache_keys))
+
+
+def count_response_cache(outcome):
+    key = RESPONSE_CACHE_STATS_KEYS[outcome]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_response_cache_stats():
+    stats = cache.get_many(RESPONSE_CACHE_STATS_KEYS.values())
+    stats = {
+        outcome: stats.get(key, 0)
+        for outcome, key in RESPONSE_CACHE_STATS_KEYS.items()
+    }
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 3) if total else None
+    return stats
+
+
+def get_anonymous_cache_key(request, recipe_id=None):
+    keys = [CATALOG_VERSION_KEY, RECIPE_LIST_VERSION_KEY]
+    if recipe_id is not None:
+        keys[1] = get_recipe_version_key(recipe_id)
+    query = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+    return 'recipes:body:{}:{}'.format(get_versions(keys), hashlib.md5(
+        f'{request.build_absolute_uri(request.path)}?{query}'.encode()
+    ).hexdigest())
+
+
+def cache_anonymous_response(method):
+
+    @wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        if (request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return method(self, request, *args, **kwargs)
+        recipe_id = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if recipe_id is not None and not str(recipe_id).isdigit():
+            return method(self, request, *args, **kwargs)
+        cache_key = get_anonymous_cache_key(request, recipe_id)
+        body = cache.get(cache_key)
+        if body is None:
+            count_response_cache('misses')
+            response = method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            body = ORJSONRenderer().render(response.data)
+            cache.set(cache_key, body, RECIPE_RESPONSE_TIMEOUT)
+            outcome = 'MISS'
+        else:
+            count_response_cache('hits')
+            outcome = 'HIT'
+        response = HttpResponse(body, content_type='application/json')
+        response['X-Cache'] = outcome
+        return response
+
+    return wrapper
+
+
+def get_catalog_response(request, build_body):
+    etag = '"{}"'.format(hashlib.md5(
+        f'{get_catalog_version()}:{request.get_full_path()}'.encode()
+    ).hexdigest())
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        cache_key = f'catalog:body:{etag}'
+        body = cache.get(cache_key)
+        if body is None:
+            body = build_body()
+            cache.set(cache_key, body, CATALOG_CACHE_TIMEOUT)
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=CATALOG_MAX_AGE)
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+class CatalogCacheMixin:
+
+    def get_catalog_data(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs).data
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return Response(self.get_catalog_data(request, *args, **kwargs))
+        return get_catalog_response(
+            request,
+            lambda: ORJSONRenderer().render(
+                self.get_catalog_data(request, *args, **kwargs)
+            )
+        )
@@ -0,0 +1,108 @@
+from django.db.models import BooleanField, Exists, OuterRef, Value
+
+from recipes.models import IngredientRecipie, Recipe
+from users.models import Subscription, User
+from .images import (
+    get_image_url, get_image_variants, get_variant_manifests
+)
+from .membership import get_recipe_ids
+
+RECIPE_CARD_FIELDS = (
+    'id', 'name', 'image', 'text', 'cooking_time', 'author_id', 'pub_date',
+)
+
+
+def get_author_cards(author_ids, request):
+    user = request.user
+    if user.is_authenticated:
+        is_subscribed = Exists(Subscription.objects.filter(
+            user=user, author=OuterRef('pk')
+        ))
+    else:
+        is_subscribed = Value(False, output_field=BooleanField())
+    storage = User._meta.get_field('avatar').storage
+    rows = User.objects.filter(id__in=author_ids).annotate(
+        is_subscribed=is_subscribed
+    ).values_list(
+        'id', 'email', 'username', 'first_name', 'last_name',
+        'is_subscribed', 'avatar'
+    )
+    manifests = get_variant_manifests(storage, [row[-1] for row in rows])
+    authors = {}
+    for (author_id, email, username, first_name, last_name, subscribed,
+         avatar) in rows:
+        authors[author_id] = {
+            'id': author_id,
+            'email': email,
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'is_subscribed': subscribed,
+            'avatar': get_image_url(storage, avatar, request) if avatar
+            else None,
+            'avatar_variants': get_image_variants(
+                storage, avatar, ('avatar',), request, manifests[avatar]
+            ) if avatar else None,
+        }
+    return authors
+
+
+def get_recipe_cards(rows, request):
+    rows = list(rows)
+    if not rows:
+        return []
+    recipe_ids = [row['id'] for row in rows]
+    authors = get_author_cards({row['author_id'] for row in rows}, request)
+    tags = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, tag_id, name, slug in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('-tag_id').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__slug'
+    ):
+        tags[recipe_id].append({'id': tag_id, 'name': name, 'slug': slug})
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id, name, unit, amount in (
+        IngredientRecipie.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('id').values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        )
+    ):
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': unit,
+            'amount': amount,
+        })
+    if request.user.is_authenticated:
+        favorites = get_recipe_ids(request.user.id, 'favorites')
+        carts = get_recipe_ids(request.user.id, 'carts')
+    storage = Recipe._meta.get_field('image').storage
+    manifests = get_variant_manifests(storage, [row['image'] for row in rows])
+    cards = []
+    for row in rows:
+        recipe_id = row['id']
+        image = row['image']
+        cards.append({
+            'id': recipe_id,
+            'name': row['name'],
+            'tags': tags[recipe_id],
+            'author': authors[row['author_id']],
+            'ingredients': ingredients[recipe_id],
+            'is_favorited': (
+                request.user.is_authenticated and recipe_id in favorites
+            ),
+            'is_in_shopping_cart': (
+                request.user.is_authenticated and recipe_id in carts
+            ),
+            'image': get_image_url(storage, image, request) if image
+            else None,
+            'image_variants': get_image_variants(
+                storage, image, ('card', 'detail'), request,
+                manifests[image]
+            ) if image else None,
+            'text': row['text'],
+            'cooking_time': row['cooking_time'],
+        })
+    return cards
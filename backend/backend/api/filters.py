@@ -1,6 +1,14 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Exists, FloatField, OuterRef
+from django.db.models.expressions import RawSQL
 from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Recipe, Tag, Ingredient
+from recipes.models import Recipe
+from .caching import get_tag_choices, get_tag_ids
+from .membership import get_recipe_ids
 
 
 class RecipeFilter(filters.FilterSet):
@@ -10,30 +18,68 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug'
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='get_tags'
     )
 
     class Meta:
         model = Recipe
         fields = ('is_favorited', 'author', 'is_in_shopping_cart', 'tags')
 
+    def get_tags(self, queryset, name, value):
+        tag_ids = get_tag_ids()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value]
+        )))
+
     def get_is_favorited(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(favorites__user=self.request.user)
+            return queryset.filter(
+                id__in=list(get_recipe_ids(self.request.user.id, 'favorites'))
+            )
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if self.request.user.is_authenticated and value:
-            return queryset.filter(carts__user=self.request.user)
+            return queryset.filter(
+                id__in=list(get_recipe_ids(self.request.user.id, 'carts'))
+            )
         return queryset
 
 
-class IngredientFilter(filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+class RecipeSearchFilter(BaseFilterBackend):
+    search_param = 'search'
 
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        words = re.findall(r'\w+', query)
+        if not words:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        if connections[queryset.db].vendor == 'postgresql':
+            tsquery = "websearch_to_tsquery('russian', %s)"
+            return queryset.filter(RawSQL(
+                f'{table}.search_vector @@ {tsquery}', (query,),
+                output_field=BooleanField()
+            )).annotate(search_rank=RawSQL(
+                f'ts_rank({table}.search_vector, {tsquery})', (query,),
+                output_field=FloatField()
+            )).order_by('-search_rank', '-pub_date', '-id')
+        match = ' '.join(
+            '"{}"*'.format(
+                re.sub(r'[аеёиоуыэюяйь]+$', '', word.lower())
+                if len(word) > 4 else word
+            ) for word in words
+        )
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s',
+            (match,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -rank FROM {table}_fts WHERE {table}_fts MATCH %s '
+            f'AND rowid = {table}.id', (match,),
+            output_field=FloatField()
+        )).order_by('-search_rank', '-pub_date', '-id')
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+VARIANT_MANIFEST_TIMEOUT = 60 * 60 * 24 * 7
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=max(1, settings.IMAGE_PROCESSING_WORKERS),
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return _executor
+
+
+def get_variant_name(name, variant):
+    return f'{os.path.splitext(name)[0]}_{variant}.webp'
+
+
+def get_image_url(storage, name, request):
+    url = storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def get_manifest_key(name):
+    return 'images:variants:{}'.format(
+        hashlib.md5(name.encode()).hexdigest()
+    )
+
+
+def read_variant_manifest(storage, name):
+    return frozenset(
+        variant for variant in settings.IMAGE_VARIANTS
+        if storage.exists(get_variant_name(name, variant))
+    )
+
+
+def refresh_variant_manifest(storage, name):
+    manifest = read_variant_manifest(storage, name)
+    cache.set(get_manifest_key(name), manifest, VARIANT_MANIFEST_TIMEOUT)
+    return manifest
+
+
+def get_variant_manifests(storage, names):
+    keys = {name: get_manifest_key(name) for name in names if name}
+    cached = cache.get_many(keys.values())
+    manifests = {}
+    missing = {}
+    for name, key in keys.items():
+        if key in cached:
+            manifests[name] = cached[key]
+        else:
+            manifests[name] = missing[key] = read_variant_manifest(
+                storage, name
+            )
+    if missing:
+        cache.set_many(missing, VARIANT_MANIFEST_TIMEOUT)
+    return manifests
+
+
+def get_image_variants(storage, name, variants, request, manifest=None):
+    if manifest is None:
+        manifest = get_variant_manifests(storage, [name])[name]
+    return {
+        variant: get_image_url(
+            storage,
+            get_variant_name(name, variant) if variant in manifest else name,
+            request
+        )
+        for variant in variants
+    }
+
+
+def delete_image_variants(storage, name):
+    for variant in settings.IMAGE_VARIANTS:
+        storage.delete(get_variant_name(name, variant))
+    cache.delete(get_manifest_key(name))
+
+
+def schedule_variant_deletion(image_field, name):
+    if name:
+        transaction.on_commit(
+            lambda: delete_image_variants(image_field.storage, name)
+        )
+
+
+def create_image_variants(path, variants):
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for variant_path, size in variants:
+            variant = image.copy()
+            variant.thumbnail(size)
+            temp_path = f'{variant_path}.tmp'
+            variant.save(temp_path, 'WEBP', quality=80)
+            os.replace(temp_path, variant_path)
+
+
+def submit_image_variants(storage, name, path, pending, on_done):
+    global _executor
+
+    def done(future):
+        error = future.exception()
+        if error is not None:
+            logger.error(
+                'Creating image variants of %s failed', name,
+                exc_info=(type(error), error, error.__traceback__)
+            )
+            return
+        refresh_variant_manifest(storage, name)
+        if on_done:
+            on_done()
+
+    try:
+        future = get_executor().submit(create_image_variants, path, pending)
+    except BrokenProcessPool:
+        logger.exception('Image processing pool is broken, restarting it')
+        _executor = None
+        future = get_executor().submit(create_image_variants, path, pending)
+    future.add_done_callback(done)
+
+
+def schedule_image_variants(image, variants, on_done=None):
+    if not image:
+        return
+    storage = image.storage
+    manifest = get_variant_manifests(storage, [image.name])[image.name]
+    pending = [
+        (storage.path(get_variant_name(image.name, variant)),
+         settings.IMAGE_VARIANTS[variant])
+        for variant in variants if variant not in manifest
+    ]
+    if pending:
+        name = image.name
+        path = image.path
+        transaction.on_commit(
+            lambda: submit_image_variants(
+                storage, name, path, pending, on_done
+            )
+        )
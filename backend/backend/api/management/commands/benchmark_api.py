@@ -0,0 +1,375 @@
+import base64
+import io
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, call_command
+from django.db import connection
+from django.test import Client, RequestFactory
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api.caching import bump_catalog_version, get_response_cache_stats
+from api.cards import RECIPE_CARD_FIELDS, get_recipe_cards
+from api.middleware import RequestTimings, current_timings
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.search import ingredient_index
+from api.serializers import RecipeGetSerializer
+from api.views import RecipieViewSet
+from backend.postgresql_pool.pool import get_pool_stats
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipie, Recipe, ShoppingCart, Tag
+)
+from users.models import Subscription, User
+
+BENCHMARK_HOST = 'localhost'
+SERIALIZER_PAGE_SIZES = (6, 50, 200)
+UPLOAD_IMAGE_SIZE = 1024 * 1024
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+class Command(BaseCommand):
+    help = 'Measuring latency and query counts of the read endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--ingredients_per_recipe', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help="favorites per user")
+        parser.add_argument('--carts', type=int, default=10,
+                            help="shopping cart recipes per user")
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help="followed authors per user")
+        parser.add_argument('--requests', type=int, default=50,
+                            help="measured requests per endpoint")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', type=str,
+                            help="path of the JSON report")
+        parser.add_argument('--compare', type=str,
+                            help="JSON report to compare the results with")
+        parser.add_argument('--keepdb', action='store_true',
+                            help="reuse the benchmark database")
+
+    def seed(self, options):
+        rand = random.Random(options['seed'])
+        User.objects.bulk_create(
+            User(
+                username=f'bench{i}', email=f'bench{i}@example.com',
+                first_name='Bench', last_name=str(i),
+                password=make_password(None)
+            ) for i in range(options['users'])
+        )
+        users = list(User.objects.values_list('id', flat=True))
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(options['ingredients'])
+        )
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        Tag.objects.bulk_create(
+            Tag(name=name, slug=slug) for name, slug in (
+                ('Завтрак', 'breakfast'), ('Обед', 'dinner'),
+                ('Ужин', 'supper'),
+            )
+        )
+        tags = list(Tag.objects.values_list('id', flat=True))
+        Recipe.objects.bulk_create(
+            Recipe(
+                author_id=rand.choice(users), name=f'Рецепт {i}',
+                text='Описание рецепта ' * 10, image='media/benchmark.png',
+                cooking_time=rand.randint(1, 120)
+            ) for i in range(options['recipes'])
+        )
+        recipes = list(Recipe.objects.values_list('id', flat=True))
+        IngredientRecipie.objects.bulk_create(
+            IngredientRecipie(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=rand.randint(1, 500)
+            )
+            for recipe_id in recipes
+            for ingredient_id in rand.sample(
+                ingredients, min(len(ingredients),
+                                 options['ingredients_per_recipe'])
+            )
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipes
+            for tag_id in rand.sample(tags, rand.randint(1, len(tags)))
+        )
+        for model, count in ((Favorite, options['favorites']),
+                             (ShoppingCart, options['carts'])):
+            model.objects.bulk_create(
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in users
+                for recipe_id in rand.sample(
+                    recipes, min(len(recipes), count)
+                )
+            )
+        Subscription.objects.bulk_create(
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id in users
+            for author_id in rand.sample(
+                users, min(len(users), options['subscriptions'] + 1)
+            ) if author_id != user_id
+        )
+        call_command('rebuild_shopping_lists', stdout=self.stdout)
+        bump_catalog_version()
+        return users[0], recipes[len(recipes) // 2]
+
+    def measure(self, client, url, count):
+        client.get(url)
+        timings = []
+        queries = []
+        for _ in range(count):
+            request_timings = RequestTimings(0)
+            token = current_timings.set(request_timings)
+            try:
+                start = time.perf_counter()
+                response = client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                current_timings.reset(token)
+            queries.append(request_timings.queries)
+        timings.sort()
+        return {
+            'url': url,
+            'status': response.status_code,
+            'bytes': len(response.getvalue()) if not response.streaming
+            else None,
+            'queries': max(queries),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p90_ms': round(percentile(timings, 0.9), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+        }
+
+    def time_call(self, function, count):
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            content = function()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return content, round(percentile(timings, 0.5), 3)
+
+    def measure_serializers(self, user, count):
+        request = Request(
+            RequestFactory().get('/api/recipes/', SERVER_NAME=BENCHMARK_HOST)
+        )
+        request.user = user
+        renderer = JSONRenderer()
+        results = {}
+        for page_size in SERIALIZER_PAGE_SIZES:
+            view = RecipieViewSet(request=request, action='retrieve')
+            instances = view.get_queryset().order_by(
+                *RecipieViewSet.ordering
+            )[:page_size]
+            rows = Recipe.objects.order_by(
+                *RecipieViewSet.ordering
+            ).values(*RECIPE_CARD_FIELDS)[:page_size]
+            serializer_content, serializer_ms = self.time_call(
+                lambda: renderer.render(RecipeGetSerializer(
+                    instances.all(), many=True, context={'request': request}
+                ).data),
+                count
+            )
+            cards_content, cards_ms = self.time_call(
+                lambda: renderer.render(
+                    get_recipe_cards(rows.all(), request)
+                ),
+                count
+            )
+            results[page_size] = {
+                'serializer_p50_ms': serializer_ms,
+                'cards_p50_ms': cards_ms,
+                'speedup': round(serializer_ms / cards_ms, 2),
+                'identical': serializer_content == cards_content,
+            }
+        return results
+
+    def measure_json(self, request, count):
+        recipe_cards = get_recipe_cards(
+            Recipe.objects.values(*RECIPE_CARD_FIELDS)[:200], request
+        )
+        renders = {
+            'recipe_cards_200': recipe_cards,
+            'ingredient_catalog': ingredient_index.all(),
+        }
+        recipe_body = json.dumps({
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 10,
+            'tags': [1], 'ingredients': [{'id': 1, 'amount': 10}],
+            'image': 'data:image/png;base64,' + base64.b64encode(
+                os.urandom(UPLOAD_IMAGE_SIZE)
+            ).decode(),
+        }).encode()
+        results = {}
+        for name, data in renders.items():
+            result = results[f'render_{name}'] = {}
+            contents = set()
+            for label, renderer in (('json', JSONRenderer()),
+                                    ('orjson', ORJSONRenderer())):
+                content, result[f'{label}_p50_ms'] = self.time_call(
+                    lambda: renderer.render(data), count
+                )
+                contents.add(content)
+            result['bytes'] = len(content)
+            result['identical'] = len(contents) == 1
+        result = results['parse_recipe_upload'] = {'bytes': len(recipe_body)}
+        for label, parser in (('json', JSONParser()),
+                              ('orjson', ORJSONParser())):
+            _, result[f'{label}_p50_ms'] = self.time_call(
+                lambda: parser.parse(
+                    io.BytesIO(recipe_body), 'application/json', {}
+                ),
+                count
+            )
+        for result in results.values():
+            result['speedup'] = round(
+                result['json_p50_ms'] / result['orjson_p50_ms'], 2
+            )
+            result['orjson_mb_per_s'] = round(
+                result['bytes'] / result['orjson_p50_ms'] / 1000, 1
+            )
+        return results
+
+    def run_benchmarks(self, options):
+        user_id, recipe_id = self.seed(options)
+        token = Token.objects.create(user_id=user_id)
+        anonymous = Client(SERVER_NAME=BENCHMARK_HOST)
+        client = Client(
+            SERVER_NAME=BENCHMARK_HOST,
+            HTTP_AUTHORIZATION=f'Token {token.key}'
+        )
+        endpoints = {
+            'recipes_list_anonymous': (anonymous, '/api/recipes/'),
+            'recipes_list': (client, '/api/recipes/'),
+            'recipes_list_limit_50': (client, '/api/recipes/?limit=50'),
+            'recipes_list_deep_page': (
+                client, f'/api/recipes/?page={options["recipes"] // 12}'
+            ),
+            'recipes_list_filtered': (
+                client, '/api/recipes/?tags=breakfast&tags=dinner'
+                        '&is_favorited=1'
+            ),
+            'recipes_detail': (client, f'/api/recipes/{recipe_id}/'),
+            'subscriptions': (
+                client, '/api/users/subscriptions/?recipes_limit=3'
+            ),
+            'ingredients_search': (
+                anonymous, '/api/ingredients/?name=ингредиент 1'
+            ),
+            'ingredients_catalog': (anonymous, '/api/ingredients/'),
+            'tags': (anonymous, '/api/tags/'),
+            'download_shopping_cart': (
+                client, '/api/recipes/download_shopping_cart/'
+            ),
+            'users_me': (client, '/api/users/me/'),
+        }
+        results = {
+            name: self.measure(endpoint_client, url, options['requests'])
+            for name, (endpoint_client, url) in endpoints.items()
+        }
+        results['anonymous_response_cache'] = get_response_cache_stats()
+        results['db_pool'] = get_pool_stats()
+        user = User.objects.get(id=user_id)
+        serializers = self.measure_serializers(user, options['requests'])
+        request = Request(
+            RequestFactory().get('/api/recipes/', SERVER_NAME=BENCHMARK_HOST)
+        )
+        request.user = user
+        serializers.update(self.measure_json(request, options['requests']))
+        return results, serializers
+
+    def get_revision(self):
+        try:
+            return subprocess.run(
+                ('git', 'rev-parse', '--short', 'HEAD'),
+                capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb']
+        )
+        try:
+            with override_settings(REQUEST_TIMING={
+                **settings.REQUEST_TIMING, 'SAMPLE_RATE': 0
+            }):
+                results, serializers = self.run_benchmarks(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb']
+            )
+        report = {
+            'revision': self.get_revision(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'dataset': {
+                key: options[key] for key in (
+                    'users', 'recipes', 'ingredients',
+                    'ingredients_per_recipe', 'favorites', 'carts',
+                    'subscriptions', 'requests', 'seed',
+                )
+            },
+            'results': results,
+            'serialization': serializers,
+        }
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)['results']
+            for name, result in results.items():
+                if name in baseline and 'p50_ms' in result:
+                    result['p50_change'] = round(
+                        result['p50_ms'] / baseline[name]['p50_ms'], 3
+                    )
+                    result['queries_change'] = (
+                        result['queries'] - baseline[name]['queries']
+                    )
+        for name, result in results.items():
+            if 'status' not in result:
+                continue
+            self.stderr.write(
+                f'{name:26} {result["status"]} q={result["queries"]:<3} '
+                f'p50={result["p50_ms"]:.2f}ms p99={result["p99_ms"]:.2f}ms'
+            )
+        for name, result in serializers.items():
+            if name in SERIALIZER_PAGE_SIZES:
+                self.stderr.write(
+                    f'recipe cards x{name:<4} '
+                    f'serializer={result["serializer_p50_ms"]:.2f}ms '
+                    f'fast path={result["cards_p50_ms"]:.2f}ms '
+                    f'speedup={result["speedup"]} '
+                    f'identical={result["identical"]}'
+                )
+            else:
+                self.stderr.write(
+                    f'{name:26} json={result["json_p50_ms"]:.2f}ms '
+                    f'orjson={result["orjson_p50_ms"]:.2f}ms '
+                    f'speedup={result["speedup"]} '
+                    f'({result["orjson_mb_per_s"]} MB/s)'
+                )
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(content)
+        else:
+            self.stdout.write(content)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import time
+from urllib.parse import quote, urlsplit
+
+from django.core.management import BaseCommand
+
+from .benchmark_api import percentile
+
+DEFAULT_PATHS = ('/api/tags/', '/api/ingredients/?name=а', '/api/users/me/')
+SLOW_BODY_SIZE = 64 * 1024
+SLOW_CHUNK_SIZE = 1024
+
+
+class Command(BaseCommand):
+    help = 'Load testing a running server with fast and slow clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', type=str,
+                            default='http://localhost:7000')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help="requested path, may be repeated")
+        parser.add_argument('--token', type=str,
+                            help="token of the requesting user")
+        parser.add_argument('--clients', type=int, default=50,
+                            help="clients sending requests in a loop")
+        parser.add_argument('--slow_clients', type=int, default=50,
+                            help="clients trickling a request body")
+        parser.add_argument('--slow_delay', type=float, default=0.1,
+                            help="seconds between slow client chunks")
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--output', type=str,
+                            help="path of the JSON report")
+
+    def build_request(self, method, path, body=b''):
+        lines = [
+            f'{method} {quote(path, safe="/?=&")} HTTP/1.1',
+            f'Host: {self.host}',
+            'Accept: application/json',
+            'Connection: close',
+        ]
+        if self.token:
+            lines.append(f'Authorization: Token {self.token}')
+        if body:
+            lines.append('Content-Type: application/json')
+            lines.append(f'Content-Length: {len(body)}')
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode(), body
+
+    async def send(self, head, body, delay=0):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(head)
+            for start in range(0, len(body), SLOW_CHUNK_SIZE):
+                writer.write(body[start:start + SLOW_CHUNK_SIZE])
+                await writer.drain()
+                await asyncio.sleep(delay)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        return int(response.split(b' ', 2)[1])
+
+    async def fast_client(self, number, deadline, results):
+        paths = self.paths
+        index = number
+        while time.monotonic() < deadline:
+            head, body = self.build_request('GET', paths[index % len(paths)])
+            index += 1
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(
+                    self.send(head, body), self.timeout
+                )
+            except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+                results['errors'] += 1
+                continue
+            results['timings'].append((time.perf_counter() - start) * 1000)
+            results['statuses'][status] = (
+                results['statuses'].get(status, 0) + 1
+            )
+
+    async def slow_client(self, deadline, results):
+        body = json.dumps({'text': ' ' * SLOW_BODY_SIZE}).encode()
+        while time.monotonic() < deadline:
+            head, body = self.build_request('POST', '/api/recipes/', body)
+            try:
+                await asyncio.wait_for(
+                    self.send(head, body, self.slow_delay), self.timeout
+                )
+                results['slow_requests'] += 1
+            except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+                results['slow_errors'] += 1
+
+    async def run(self, options):
+        results = {
+            'timings': [], 'statuses': {}, 'errors': 0,
+            'slow_requests': 0, 'slow_errors': 0,
+        }
+        deadline = time.monotonic() + options['duration']
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(self.fast_client(number, deadline, results)
+              for number in range(options['clients'])),
+            *(self.slow_client(deadline, results)
+              for _ in range(options['slow_clients'])),
+        )
+        return results, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.paths = options['paths'] or DEFAULT_PATHS
+        self.token = options['token']
+        self.timeout = options['timeout']
+        self.slow_delay = options['slow_delay']
+        results, elapsed = asyncio.run(self.run(options))
+        timings = sorted(results['timings'])
+        report = {
+            'url': options['url'],
+            'paths': list(self.paths),
+            'clients': options['clients'],
+            'slow_clients': options['slow_clients'],
+            'duration_s': round(elapsed, 3),
+            'requests': len(timings),
+            'errors': results['errors'],
+            'statuses': results['statuses'],
+            'throughput_rps': round(len(timings) / elapsed, 1),
+            'slow_requests': results['slow_requests'],
+            'slow_errors': results['slow_errors'],
+        }
+        if timings:
+            report.update({
+                'p50_ms': round(percentile(timings, 0.5), 3),
+                'p90_ms': round(percentile(timings, 0.9), 3),
+                'p99_ms': round(percentile(timings, 0.99), 3),
+                'max_ms': round(timings[-1], 3),
+            })
+        self.stderr.write(
+            f'{report["requests"]} requests, {report["errors"]} errors, '
+            f'{report["throughput_rps"]} rps, '
+            f'p50={report.get("p50_ms")}ms p99={report.get("p99_ms")}ms'
+        )
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(content)
+        else:
+            self.stdout.write(content)
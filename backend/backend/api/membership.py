@@ -0,0 +1,51 @@
+import bisect
+from array import array
+
+from django.core.cache import cache
+
+from recipes.models import Favorite, ShoppingCart
+
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+MEMBERSHIP_MODELS = {
+    'favorites': Favorite,
+    'carts': ShoppingCart,
+}
+
+
+class RecipeIdSet:
+
+    def __init__(self, ids):
+        self.ids = array('q', sorted(ids))
+
+    def __contains__(self, recipe_id):
+        index = bisect.bisect_left(self.ids, recipe_id)
+        return index < len(self.ids) and self.ids[index] == recipe_id
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def get_cache_key(user_id, relation):
+    return f'membership:{relation}:{user_id}'
+
+
+def refresh_recipe_ids(user_id, relation):
+    recipe_ids = RecipeIdSet(
+        MEMBERSHIP_MODELS[relation].objects.filter(
+            user_id=user_id
+        ).values_list('recipe_id', flat=True)
+    )
+    cache.set(
+        get_cache_key(user_id, relation), recipe_ids, MEMBERSHIP_CACHE_TIMEOUT
+    )
+    return recipe_ids
+
+
+def get_recipe_ids(user_id, relation):
+    recipe_ids = cache.get(get_cache_key(user_id, relation))
+    if recipe_ids is None:
+        recipe_ids = refresh_recipe_ids(user_id, relation)
+    return recipe_ids
@@ -0,0 +1,159 @@
+import heapq
+import json
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+MAX_SQL_LENGTH = 1000
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings(execute, sql, params, many, context)
+
+
+class RequestTimings:
+
+    def __init__(self, worst_queries):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.worst = []
+        self.worst_queries = worst_queries
+        self.view_start = None
+        self.view_db_ms = 0.0
+        self.view_ms = None
+        self.render_start = None
+        self.render_ms = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            self.queries += 1
+            self.db_ms += duration
+            entry = (duration, sql[:MAX_SQL_LENGTH])
+            if len(self.worst) < self.worst_queries:
+                heapq.heappush(self.worst, entry)
+            elif self.worst:
+                heapq.heappushpop(self.worst, entry)
+
+    def start_view(self):
+        self.view_start = time.perf_counter()
+        self.view_db_ms = self.db_ms
+
+    def finish_view(self):
+        if self.view_start is None or self.view_ms is not None:
+            return
+        self.view_ms = max(
+            0.0,
+            (time.perf_counter() - self.view_start) * 1000
+            - (self.db_ms - self.view_db_ms)
+        )
+
+    def start_render(self):
+        self.render_start = time.perf_counter()
+
+    def finish_render(self):
+        self.render_ms = (time.perf_counter() - self.render_start) * 1000
+
+    def total_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self, total_ms):
+        metrics = [
+            f'db;dur={self.db_ms:.1f};desc="{self.queries} queries"'
+        ]
+        if self.view_ms is not None:
+            metrics.append(f'view;dur={self.view_ms:.1f}')
+        if self.render_ms is not None:
+            metrics.append(f'render;dur={self.render_ms:.1f}')
+        metrics.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(metrics)
+
+
+class RequestTimingMiddleware(MiddlewareMixin):
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.sample_rate = settings.REQUEST_TIMING['SAMPLE_RATE']
+        self.slow_request_ms = settings.REQUEST_TIMING['SLOW_REQUEST_MS']
+        self.slow_request_queries = (
+            settings.REQUEST_TIMING['SLOW_REQUEST_QUERIES']
+        )
+        self.worst_queries = settings.REQUEST_TIMING['WORST_QUERIES']
+
+    def process_request(self, request):
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return
+        request.timings = RequestTimings(self.worst_queries)
+        current_timings.set(request.timings)
+
+    def process_response(self, request, response):
+        if not hasattr(request, 'timings'):
+            return response
+        current_timings.set(None)
+        timings = request.timings
+        timings.finish_view()
+        total_ms = timings.total_ms()
+        if self.exposes_timings(request):
+            response['Server-Timing'] = timings.server_timing(total_ms)
+        if (total_ms >= self.slow_request_ms
+                or timings.queries >= self.slow_request_queries):
+            self.log_slow_request(request, response, timings, total_ms)
+        return response
+
+    def exposes_timings(self, request):
+        if settings.DEBUG:
+            return True
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, 'timings'):
+            request.timings.start_view()
+
+    def process_template_response(self, request, response):
+        if hasattr(request, 'timings'):
+            timings = request.timings
+            timings.finish_view()
+            timings.start_render()
+            response.add_post_render_callback(
+                lambda response: timings.finish_render()
+            )
+        return response
+
+    def log_slow_request(self, request, response, timings, total_ms):
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'db_ms': round(timings.db_ms, 1),
+            'queries': timings.queries,
+            'view_ms': (
+                round(timings.view_ms, 1)
+                if timings.view_ms is not None else None
+            ),
+            'render_ms': (
+                round(timings.render_ms, 1)
+                if timings.render_ms is not None else None
+            ),
+            'worst_queries': [
+                {'ms': round(duration, 1), 'sql': sql}
+                for duration, sql in sorted(timings.worst, reverse=True)
+            ],
+        }, ensure_ascii=False))
@@ -1,5 +1,210 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination, PageNumberPagination, _reverse_ordering
+)
+from rest_framework.response import Response
+
+from .caching import RECIPE_LIST_VERSION_KEY, get_versions
+
+COUNT_CACHE_TIMEOUT = 30
+COUNT_ESTIMATE_THRESHOLD = 10000
+
+
+def estimate_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        return int(cursor.fetchone()[0][0]['Plan']['Plan Rows'])
+
+
+class ApproximatePage(Page):
+
+    def has_next(self):
+        return len(self) == self.paginator.per_page
+
+
+class CachedCountPaginator(Paginator):
+    approximate = False
+    version_keys = ()
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'query'):
+            return super().count
+        try:
+            sql, params = self.object_list.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        version = get_versions(self.version_keys) if self.version_keys else ''
+        cache_key = 'count:{}{}'.format(
+            version, hashlib.md5(f'{sql}:{params}'.encode()).hexdigest()
+        )
+        cached = cache.get(cache_key)
+        if cached is None:
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= COUNT_ESTIMATE_THRESHOLD:
+                cached = (estimate, True)
+            else:
+                cached = (self.object_list.count(), False)
+            cache.set(cache_key, cached, COUNT_CACHE_TIMEOUT)
+        count, self.approximate = cached
+        return count
+
+    def validate_number(self, number):
+        if not self.count or not self.approximate:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.approximate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return ApproximatePage(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+
+class RecipeCountPaginator(CachedCountPaginator):
+    version_keys = (RECIPE_LIST_VERSION_KEY,)
 
 
 class PageLimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class CachedCountPagination(PageLimitPagination):
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_approximate': self.page.paginator.approximate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class RecipeCursorPagination(CursorPagination):
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if ordering[-1].lstrip('-') != 'id':
+            ordering += ('-id' if ordering[0].startswith('-') else 'id',)
+        return ordering
+
+    def _get_position_from_instance(self, instance, ordering):
+        return json.dumps([
+            str(instance[name] if isinstance(instance, dict)
+                else getattr(instance, name))
+            for name in (order.lstrip('-') for order in ordering)
+        ])
+
+    def decode_position(self, queryset, position):
+        try:
+            values = json.loads(position)
+            if (not isinstance(values, list)
+                    or len(values) != len(self.ordering)):
+                raise ValueError(position)
+            return [
+                queryset.model._meta.get_field(
+                    order.lstrip('-')
+                ).to_python(value)
+                for order, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_keyset_filter(self, values, reverse):
+        condition = Q()
+        equal = {}
+        for order, value in zip(self.ordering, values):
+            name = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') != reverse else 'gt'
+            if not equal:
+                bound = Q(**{f'{name}__{lookup}e': value})
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return bound & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(
+                self.decode_position(queryset, current_position), reverse
+            ))
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            following_position = None
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class RecipePagination(CachedCountPagination):
+    django_paginator_class = RecipeCountPaginator
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (RecipeCursorPagination.cursor_query_param in request.query_params
+                or request.query_params.get('pagination') == 'cursor'):
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
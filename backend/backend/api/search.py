@@ -0,0 +1,128 @@
+import bisect
+import threading
+import time
+from collections import Counter
+
+from recipes.models import Ingredient
+from .caching import get_catalog_version
+
+NGRAM_SIZE = 3
+FUZZY_MIN_SIMILARITY = 0.5
+INGREDIENT_INDEX_TTL = 300
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+def substrings(value):
+    return {
+        value[i:i + size]
+        for size in range(1, NGRAM_SIZE + 1)
+        for i in range(len(value) - size + 1)
+    }
+
+
+def ngrams(value):
+    value = f' {value}'
+    return {
+        value[i:i + NGRAM_SIZE]
+        for i in range(len(value) - NGRAM_SIZE + 1)
+    }
+
+
+class IngredientIndex:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+        self._built_at = None
+        self._version = None
+
+    def invalidate(self):
+        self._built_at = None
+
+    def build(self, version=None):
+        rows = list(Ingredient.objects.order_by('id').values(
+            'id', 'name', 'measurement_unit'
+        ))
+        names = [normalize(row['name']) for row in rows]
+        keys = sorted(zip(names, range(len(rows))))
+        postings = {}
+        grams = {}
+        for position, name in enumerate(names):
+            for gram in ngrams(name):
+                postings.setdefault(gram, []).append(position)
+        for name, position in keys:
+            for gram in substrings(name):
+                grams.setdefault(gram, []).append(position)
+        self._state = (rows, names, keys, postings, grams)
+        self._built_at = time.monotonic()
+        self._version = version
+
+    def is_stale(self, version):
+        return (
+            self._built_at is None
+            or self._version != version
+            or time.monotonic() - self._built_at > INGREDIENT_INDEX_TTL
+        )
+
+    def _get_state(self):
+        version = get_catalog_version()
+        if self.is_stale(version):
+            with self._lock:
+                if self.is_stale(version):
+                    self.build(version)
+        return self._state
+
+    def find_substrings(self, query, names, grams):
+        if len(query) <= NGRAM_SIZE:
+            return grams.get(query, [])
+        candidates = min(
+            (grams.get(query[i:i + NGRAM_SIZE], [])
+             for i in range(len(query) - NGRAM_SIZE + 1)),
+            key=len
+        )
+        return [
+            position for position in candidates if query in names[position]
+        ]
+
+    def all(self):
+        return self._get_state()[0]
+
+    def search(self, query):
+        rows, names, keys, postings, grams = self._get_state()
+        query = normalize(query.strip())
+        if not query:
+            return rows
+        start = bisect.bisect_left(keys, (query,))
+        found = []
+        for name, position in keys[start:]:
+            if not name.startswith(query):
+                break
+            found.append(position)
+        seen = set(found)
+        found.extend(
+            position
+            for position in self.find_substrings(query, names, grams)
+            if position not in seen
+        )
+        seen.update(found)
+        query_grams = ngrams(query)
+        if len(query) >= NGRAM_SIZE:
+            shared = Counter(
+                position
+                for gram in query_grams
+                for position in postings.get(gram, ())
+                if position not in seen
+            )
+            fuzzy = [
+                (-count, names[position], position)
+                for position, count in shared.items()
+                if count / len(query_grams) >= FUZZY_MIN_SIMILARITY
+            ]
+            found.extend(position for *_, position in sorted(fuzzy))
+        return [rows[position] for position in found]
+
+
+ingredient_index = IngredientIndex()
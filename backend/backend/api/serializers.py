@@ -1,23 +1,45 @@
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework.validators import UniqueTogetherValidator
-from urlshortner.utils import shorten_url
 
 from recipes.models import (
     Recipe, Tag, IngredientRecipie, Ingredient, Favorite, ShoppingCart,
 )
-from .utils import create_ingredients
+from .images import get_image_variants
+from .membership import get_recipe_ids
+from .shortlinks import encode_recipe_id
+from .utils import (
+    create_ingredients, update_ingredients, update_recipe_shopping_lists
+)
 from users.models import User, Subscription
 from backend.settings import BASE_URL
 
 
+class ImageVariantsField(serializers.Field):
+
+    def __init__(self, variants, **kwargs):
+        self.variants = variants
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, image):
+        if not image:
+            return None
+        return get_image_variants(
+            image.storage, image.name, self.variants,
+            self.context.get('request')
+        )
+
+
 class RecipeSmallSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField(('card',), source='image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class UserSignUpSerializer(UserCreateSerializer):
@@ -32,15 +54,18 @@ class UserSignUpSerializer(UserCreateSerializer):
 class UserGetSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False)
+    avatar_variants = ImageVariantsField(('avatar',), source='avatar')
 
     class Meta:
         model = User
         fields = (
             'id', 'email', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'avatar'
+            'is_subscribed', 'avatar', 'avatar_variants'
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and Subscription.objects.filter(
@@ -65,17 +90,24 @@ class UserSubPresentSerializer(UserGetSerializer):
 
     def get_recipes(self, user):
         request = self.context.get('request')
-        recipes_limit = None
-        if request:
-            recipes_limit = request.query_params.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=user)
-        if recipes_limit:
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(user, 'feed_recipes'):
+            recipes = user.feed_recipes
+        else:
+            recipes_limit = None
+            if request:
+                recipes_limit = request.query_params.get('recipes_limit')
+            recipes = Recipe.objects.filter(
+                author=user
+            ).order_by('-pub_date')
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
         return RecipeSmallSerializer(
             recipes, many=True, context={'request': request}
         ).data
 
     def get_recipes_count(self, user):
+        if hasattr(user, 'recipes_count'):
+            return user.recipes_count
         return Recipe.objects.filter(
             author=user
         ).count()
@@ -163,6 +195,13 @@ class RecipePostSerializer(serializers.ModelSerializer):
         )
 
     def validate(self, data):
+        if not self.partial or 'recipeingredients' in data:
+            self.check_ingredients(data)
+        if not self.partial or 'tags' in data:
+            self.check_tags(data)
+        return data
+
+    def check_ingredients(self, data):
         ingredients_list = []
         if not data.get('recipeingredients'):
             raise serializers.ValidationError(
@@ -172,11 +211,13 @@ class RecipePostSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError(
                     'Количество не может быть меньше 1'
                 )
-            if not Ingredient.objects.filter(id=ingredient.get('id')).exists():
-                raise serializers.ValidationError(
-                    'Несуществующий ингредиент.'
-                )
             ingredients_list.append(ingredient.get('id'))
+        if Ingredient.objects.filter(
+            id__in=ingredients_list
+        ).count() != len(set(ingredients_list)):
+            raise serializers.ValidationError(
+                'Несуществующий ингредиент.'
+            )
         if len(set(ingredients_list)) != len(ingredients_list):
             raise serializers.ValidationError(
                 'Вы пытаетесь добавить в рецепт одинаковые ингредиенты'
@@ -185,6 +226,8 @@ class RecipePostSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Поле для ингредиентов пусто.'
             )
+
+    def check_tags(self, data):
         tags_list = []
         if not data.get('tags'):
             raise serializers.ValidationError(
@@ -199,7 +242,6 @@ class RecipePostSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(
                 'Вы пытаетесь добавить одинаковые тэги'
             )
-        return data
 
     def validate_image(self, value):
         if not value:
@@ -221,18 +263,29 @@ class RecipePostSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('recipeingredients')
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        IngredientRecipie.objects.filter(recipe=instance).delete()
+        ingredients = validated_data.pop('recipeingredients', None)
+        tags = validated_data.pop('tags', None)
         super().update(instance, validated_data)
-        create_ingredients(ingredients, instance)
-        instance.save()
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            update_recipe_shopping_lists(
+                instance, update_ingredients(ingredients, instance)
+            )
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=IngredientRecipie.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            )
+        )
         return RecipeGetSerializer(
             instance,
             context={'request': request}
@@ -248,27 +301,33 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField(required=False)
+    image_variants = ImageVariantsField(('card', 'detail'), source='image')
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'name', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'image', 'image_variants', 'text',
+            'cooking_time'
         )
 
+    def get_recipe_ids(self, relation):
+        key = f'{relation}_ids'
+        if key not in self.context:
+            self.context[key] = get_recipe_ids(
+                self.context['request'].user.id, relation
+            )
+        return self.context[key]
+
     def get_is_favorited(self, obj):
         request = self.context.get('request')
         return (request and request.user.is_authenticated
-                and Favorite.objects.filter(
-                    user=request.user, recipe=obj
-                ).exists())
+                and obj.id in self.get_recipe_ids('favorites'))
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
         return (request and request.user.is_authenticated
-                and ShoppingCart.objects.filter(
-                    user=request.user, recipe=obj
-                ).exists())
+                and obj.id in self.get_recipe_ids('carts'))
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -329,12 +388,7 @@ class RecipeShortLink(serializers.ModelSerializer):
         fields = ('short_link',)
 
     def get_short_link(self, obj):
-        base_url = BASE_URL
-        created = shorten_url(
-            f'{base_url}recipes/{obj.id}',
-            is_permanent=False
-        )
-        return f'{base_url}s/{created}'
+        return f'{BASE_URL}s/{encode_recipe_id(obj.id)}'
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
@@ -0,0 +1,54 @@
+import string
+import zlib
+from functools import lru_cache
+
+from urlshortner.models import Url
+
+ALPHABET = string.digits + string.ascii_letters
+LEGACY_CODE_LENGTH = 7
+
+
+def encode_base62(number):
+    code = ''
+    while True:
+        number, remainder = divmod(number, len(ALPHABET))
+        code = ALPHABET[remainder] + code
+        if not number:
+            return code
+
+
+def get_checksum(number):
+    return ALPHABET[zlib.crc32(str(number).encode()) % len(ALPHABET)]
+
+
+def encode_recipe_id(recipe_id):
+    return encode_base62(recipe_id) + get_checksum(recipe_id)
+
+
+def decode_recipe_id(code):
+    if len(code) < 2 or any(char not in ALPHABET for char in code):
+        return None
+    recipe_id = 0
+    for char in code[:-1]:
+        recipe_id = recipe_id * len(ALPHABET) + ALPHABET.index(char)
+    if get_checksum(recipe_id) != code[-1]:
+        return None
+    return recipe_id
+
+
+@lru_cache(maxsize=4096)
+def resolve_legacy_code(code):
+    url = Url.objects.filter(short_url=code).values_list('url', flat=True)
+    return url.first()
+
+
+def resolve_short_link(code, base_url):
+    if (len(code) == LEGACY_CODE_LENGTH
+            and all(char in string.hexdigits for char in code)):
+        url = resolve_legacy_code(code)
+        if url:
+            return url
+    recipe_id = decode_recipe_id(code)
+    if recipe_id is None:
+        return None
+    return f'{base_url}recipes/{recipe_id}'
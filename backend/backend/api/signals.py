@@ -0,0 +1,199 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (
+    Favorite, Ingredient, IngredientRecipie, Recipe, ShoppingCart, Tag
+)
+from users.models import User
+from .caching import (
+    bump_catalog_version, invalidate_recipe_responses, invalidate_tokens
+)
+from .images import schedule_image_variants, schedule_variant_deletion
+from .membership import refresh_recipe_ids
+from .middleware import record_query
+from .search import ingredient_index
+from .utils import get_recipe_amounts, update_shopping_lists
+
+
+@receiver(connection_created)
+def time_queries(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_catalog(**kwargs):
+    bump_catalog_version()
+
+
+AUTHOR_CARD_FIELDS = {
+    'email', 'username', 'first_name', 'last_name', 'avatar',
+}
+
+
+IMAGE_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+@receiver(pre_save, sender=Recipe)
+@receiver(pre_save, sender=User)
+def remember_image(sender, instance, update_fields=None, **kwargs):
+    field_name = IMAGE_FIELDS[sender]
+    instance._previous_image = None
+    if instance.pk is None or (
+            update_fields is not None and field_name not in update_fields):
+        return
+    instance._previous_image = sender.objects.filter(
+        pk=instance.pk
+    ).values_list(field_name, flat=True).first()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def delete_replaced_image(sender, instance, **kwargs):
+    field_name = IMAGE_FIELDS[sender]
+    previous = getattr(instance, '_previous_image', None)
+    if previous and previous != getattr(instance, field_name).name:
+        schedule_variant_deletion(sender._meta.get_field(field_name), previous)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def delete_image(sender, instance, **kwargs):
+    field_name = IMAGE_FIELDS[sender]
+    schedule_variant_deletion(
+        sender._meta.get_field(field_name),
+        getattr(instance, field_name).name
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def process_recipe_image(instance, **kwargs):
+    schedule_image_variants(
+        instance.image, ('card', 'detail'),
+        lambda: invalidate_recipe_responses([instance.id])
+    )
+
+
+@receiver(post_save, sender=User)
+def process_avatar(instance, created=False, update_fields=None, **kwargs):
+    if update_fields and not AUTHOR_CARD_FIELDS.intersection(update_fields):
+        return
+    recipe_ids = None if created else list(
+        Recipe.objects.filter(author=instance).values_list('id', flat=True)
+    )
+    if not recipe_ids:
+        schedule_image_variants(instance.avatar, ('avatar',))
+        return
+    invalidate_recipe_responses(recipe_ids)
+    schedule_image_variants(
+        instance.avatar, ('avatar',),
+        lambda: invalidate_recipe_responses(recipe_ids)
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    invalidate_recipe_responses([instance.id])
+
+
+@receiver((post_save, post_delete), sender=IngredientRecipie)
+def invalidate_recipe_ingredients(instance, **kwargs):
+    invalidate_recipe_responses([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'pre_clear':
+        recipe_ids = list(Recipe.tags.through.objects.filter(
+            tag_id=instance.pk
+        ).values_list('recipe_id', flat=True))
+    else:
+        recipe_ids = list(pk_set)
+    invalidate_recipe_responses(recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def refresh_favorites(instance, **kwargs):
+    transaction.on_commit(
+        lambda: refresh_recipe_ids(instance.user_id, 'favorites')
+    )
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def refresh_carts(instance, **kwargs):
+    transaction.on_commit(
+        lambda: refresh_recipe_ids(instance.user_id, 'carts')
+    )
+
+
+def negate_amounts(amounts):
+    return {
+        ingredient_id: -amount for ingredient_id, amount in amounts.items()
+    }
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def remember_cart(instance, **kwargs):
+    instance._previous_cart = None if instance.pk is None else (
+        ShoppingCart.objects.filter(pk=instance.pk).values_list(
+            'user_id', 'recipe_id'
+        ).first()
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_to_shopping_list(instance, created, **kwargs):
+    previous = getattr(instance, '_previous_cart', None)
+    if previous == (instance.user_id, instance.recipe_id):
+        return
+    with transaction.atomic():
+        if previous and not created:
+            user_id, recipe_id = previous
+            update_shopping_lists(
+                [user_id], negate_amounts(get_recipe_amounts(recipe_id))
+            )
+        update_shopping_lists(
+            [instance.user_id], get_recipe_amounts(instance.recipe_id)
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remember_cart_amounts(instance, **kwargs):
+    instance._recipe_amounts = get_recipe_amounts(instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_cart_from_shopping_list(instance, **kwargs):
+    amounts = getattr(instance, '_recipe_amounts', None)
+    if amounts is None:
+        amounts = get_recipe_amounts(instance.recipe_id)
+    update_shopping_lists([instance.user_id], negate_amounts(amounts))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_tokens(list(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    ))
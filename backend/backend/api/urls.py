@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from . import async_views
 from .views import (
     TagViewSet, RecipieViewSet, IngredientViewSet, UserSubsriptionViewSet,
-    UserSubscribeViewSet, avatar, me
+    UserSubscribeViewSet, avatar, db_pool_stats, me
 )
 
 
@@ -19,7 +21,18 @@ urlpatterns = [
         {'get': 'list'}
     )),
     path('users/<int:user_id>/subscribe/', UserSubscribeViewSet.as_view()),
+    path('stats/db-pool/', db_pool_stats),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.SERVER_MODE == 'asgi':
+    urlpatterns = [
+        path('users/me/', async_views.me),
+        path('users/<int:user_id>/subscribe/', async_views.subscribe),
+        path('recipes/<int:pk>/favorite/', async_views.favorite),
+        path('recipes/<int:pk>/shopping_cart/', async_views.shopping_cart),
+        path('tags/', async_views.tags),
+        path('ingredients/', async_views.ingredients),
+    ] + urlpatterns
@@ -1,21 +1,59 @@
+import csv
+import json
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
 from rest_framework import status
 from rest_framework.response import Response
 
-from recipes.models import IngredientRecipie, Ingredient
+from recipes.models import IngredientRecipie, ShoppingCart, ShoppingListItem
+
+SHOPPING_LIST_CHUNK_SIZE = 2000
 
 
 def create_ingredients(ingredients, recipe):
-    ingredient_list = []
-    for ingredient in ingredients:
-        amount = ingredient.get('amount')
-        ingredient_list.append(
-            IngredientRecipie(
-                recipe=recipe,
-                ingredient=Ingredient.objects.get(pk=ingredient.get('id')),
-                amount=amount
-            )
+    IngredientRecipie.objects.bulk_create(
+        IngredientRecipie(
+            recipe=recipe,
+            ingredient_id=ingredient.get('id'),
+            amount=ingredient.get('amount')
+        ) for ingredient in ingredients
+    )
+
+
+def update_ingredients(ingredients, recipe):
+    current = {
+        item.ingredient_id: item
+        for item in IngredientRecipie.objects.filter(recipe=recipe)
+    }
+    amounts = {
+        ingredient.get('id'): ingredient.get('amount')
+        for ingredient in ingredients
+    }
+    delta = {
+        ingredient_id: amounts.get(ingredient_id, 0) - (
+            current[ingredient_id].amount if ingredient_id in current else 0
         )
-    IngredientRecipie.objects.bulk_create(ingredient_list)
+        for ingredient_id in current.keys() | amounts.keys()
+    }
+    removed = current.keys() - amounts.keys()
+    if removed:
+        IngredientRecipie.objects.filter(
+            recipe=recipe, ingredient_id__in=removed
+        ).delete()
+    changed = []
+    for ingredient_id, item in current.items():
+        if ingredient_id in amounts and item.amount != amounts[ingredient_id]:
+            item.amount = amounts[ingredient_id]
+            changed.append(item)
+    if changed:
+        IngredientRecipie.objects.bulk_update(changed, ['amount'])
+    create_ingredients(
+        [ingredient for ingredient in ingredients
+         if ingredient.get('id') not in current],
+        recipe
+    )
+    return delta
 
 
 def create_model_instance(request, instance, serializer_name):
@@ -35,3 +73,105 @@ def delete_model_instance(request, model_name, instance, error_message):
     return Response(
         {'errors': error_message}, status=status.HTTP_400_BAD_REQUEST
     )
+
+
+def get_recipe_amounts(recipe):
+    return dict(IngredientRecipie.objects.filter(
+        recipe=recipe
+    ).values_list('ingredient_id', 'amount'))
+
+
+def update_shopping_lists(user_ids, amounts):
+    amounts = {
+        ingredient_id: amount
+        for ingredient_id, amount in amounts.items() if amount
+    }
+    if not amounts:
+        return
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    with transaction.atomic():
+        ShoppingListItem.objects.bulk_create([
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=0
+            )
+            for user_id in user_ids
+            for ingredient_id, amount in amounts.items() if amount > 0
+        ], ignore_conflicts=True)
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=amounts
+        ).update(amount=F('amount') + Case(
+            *[When(ingredient_id=ingredient_id, then=Value(amount))
+              for ingredient_id, amount in amounts.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        ))
+        ShoppingListItem.objects.filter(
+            user_id__in=user_ids, amount__lte=0
+        ).delete()
+
+
+def update_recipe_shopping_lists(recipe, amounts):
+    update_shopping_lists(
+        ShoppingCart.objects.filter(
+            recipe=recipe
+        ).values_list('user_id', flat=True),
+        amounts
+    )
+
+
+def get_shopping_list(user):
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+        ingredient_amount=F('amount')
+    ).order_by(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_txt(ingredients):
+    yield 'Список покупок:\n'
+    for ingredient in ingredients:
+        name = ingredient['ingredient__name']
+        unit = ingredient['ingredient__measurement_unit']
+        amount = ingredient['ingredient_amount']
+        yield f'\n{name} - {amount} {unit}'
+
+
+def shopping_list_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['ingredient_amount'],
+        ))
+
+
+def shopping_list_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield separator + json.dumps({
+            'name': ingredient['ingredient__name'],
+            'measurement_unit': ingredient['ingredient__measurement_unit'],
+            'amount': ingredient['ingredient_amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield '[]' if separator == '[' else ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': (shopping_list_txt, 'text/plain'),
+    'csv': (shopping_list_csv, 'text/csv'),
+    'json': (shopping_list_json, 'application/json'),
+}
@@ -1,11 +1,19 @@
 from rest_framework import viewsets, filters, mixins, status
-from django.shortcuts import get_object_or_404, HttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import (
+    Http404, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+)
+from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.permissions import (
-    AllowAny, IsAuthenticated, IsAuthenticatedOrReadOnly
+    AllowAny, IsAdminUser, IsAuthenticated, IsAuthenticatedOrReadOnly
+)
+from rest_framework.decorators import (
+    action, api_view, permission_classes
+)
+from django.db.models import (
+    BooleanField, Count, Exists, OuterRef, Prefetch, Subquery, Value
 )
-from rest_framework.decorators import action, api_view
-from django.db.models import Sum
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
@@ -13,7 +21,13 @@ from recipes.models import (
     Recipe, Tag, Ingredient, Favorite, ShoppingCart,
     IngredientRecipie
 )
+from .caching import CatalogCacheMixin, cache_anonymous_response
+from .cards import RECIPE_CARD_FIELDS, get_recipe_cards
+from .negotiation import IgnoreClientContentNegotiation
+from .pagination import RecipePagination
 from .permissions import AuthorAdminOrReadOnly
+from .search import ingredient_index
+from .shortlinks import resolve_short_link
 from .serializers import (
     TagSerializer, IngredientSerializer,
     RecipePostSerializer, RecipeGetSerializer,
@@ -22,24 +36,67 @@ from .serializers import (
     AvatarSerializer, RecipeShortLink,
     UserSelfSerializer
 )
-from .utils import create_model_instance, delete_model_instance
-from .filters import RecipeFilter, IngredientFilter
+from .utils import (
+    create_model_instance, delete_model_instance, get_shopping_list,
+    SHOPPING_LIST_FORMATS
+)
+from .filters import RecipeFilter, RecipeSearchFilter
 from users.models import User, Subscription
+from backend.postgresql_pool.pool import get_pool_stats
+from backend.settings import BASE_URL
 
 
 class RecipieViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
     permission_classes = (AuthorAdminOrReadOnly,)
-    filter_backends = (DjangoFilterBackend, filters.OrderingFilter,)
+    filter_backends = (
+        DjangoFilterBackend, filters.OrderingFilter, RecipeSearchFilter,
+    )
     ordering_fields = ('pub_date')
+    ordering = ('-pub_date', '-id')
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
     http_method_names = ('get', 'post', 'patch', 'delete')
 
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        if self.action != 'retrieve':
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            is_subscribed = Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        else:
+            is_subscribed = Value(False, output_field=BooleanField())
+        return queryset.prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(is_subscribed=is_subscribed)
+            ),
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=IngredientRecipie.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            )
+        )
+
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
             return RecipeGetSerializer
         return RecipePostSerializer
 
+    @cache_anonymous_response
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset.values(*RECIPE_CARD_FIELDS))
+        return self.get_paginated_response(get_recipe_cards(page, request))
+
+    @cache_anonymous_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -75,22 +132,31 @@ class RecipieViewSet(viewsets.ModelViewSet):
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[IsAuthenticated, ]
+        permission_classes=[IsAuthenticated, ],
+        content_negotiation_class=IgnoreClientContentNegotiation
     )
     def download_shopping_cart(self, request):
-        ingredients = IngredientRecipie.objects.filter(
-            recipe__carts__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingredient_amount=Sum('amount'))
-        shopping_list = ['Список покупок:\n']
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['ingredient_amount']
-            shopping_list.append(f'\n{name} - {amount} {unit}')
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = 'attachment; filename="cart.txt"'
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in SHOPPING_LIST_FORMATS:
+            return Response(
+                {'errors': 'Доступные форматы: '
+                 + ', '.join(SHOPPING_LIST_FORMATS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        writer, content_type = SHOPPING_LIST_FORMATS[export_format]
+        content = writer(get_shopping_list(request.user))
+        content_type = f'{content_type}; charset=utf-8'
+        if isinstance(request._request, ASGIRequest):
+            response = HttpResponse(
+                ''.join(content), content_type=content_type
+            )
+        else:
+            response = StreamingHttpResponse(
+                content, content_type=content_type
+            )
+        response['Content-Disposition'] = (
+            f'attachment; filename="cart.{export_format}"'
+        )
         return response
 
     @action(
@@ -105,27 +171,46 @@ class RecipieViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
     pagination_class = None
 
+    def get_catalog_data(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return ingredient_index.search(name)
+        return ingredient_index.all()
+
 
 class UserSubsriptionViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = UserSubPresentSerializer
 
     def get_queryset(self):
-        return User.objects.filter(following__user=self.request.user)
+        recipes = Recipe.objects.order_by('-pub_date')
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.filter(pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date').values('pk')[:int(recipes_limit)]
+            ))
+        return User.objects.filter(
+            following__user=self.request.user
+        ).annotate(
+            recipes_count=Count('recipe'),
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).prefetch_related(
+            Prefetch('recipe_set', queryset=recipes, to_attr='feed_recipes')
+        ).order_by('id')
 
 
 class UserSubscribeViewSet(APIView):
@@ -173,10 +258,23 @@ def avatar(request):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-@api_view(['GET'])
+@api_view(['GET', 'HEAD'])
 def me(request):
     if not request.user.is_authenticated:
         return Response(status=status.HTTP_401_UNAUTHORIZED)
     user = get_object_or_404(User, id=request.user.id)
     serializer = UserSelfSerializer(user)
     return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def db_pool_stats(request):
+    return Response(get_pool_stats())
+
+
+def short_link(request, code):
+    url = resolve_short_link(code, BASE_URL)
+    if url is None:
+        raise Http404
+    return HttpResponseRedirect(url)
@@ -0,0 +1,32 @@
+from django.db import connections
+from django.http import HttpRequest
+from django.urls import reverse
+
+from .caching import get_tag_ids
+from .search import ingredient_index
+from .views import IngredientViewSet, TagViewSet
+
+CATALOGS = (
+    ('tags-list', TagViewSet),
+    ('ingredients-list', IngredientViewSet),
+)
+
+
+def prime_catalog(url_name, viewset):
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = reverse(url_name)
+    request.META['HTTP_ACCEPT'] = 'application/json'
+    viewset.as_view({'get': 'list'})(request)
+
+
+def warm_up():
+    try:
+        for connection in connections.all():
+            connection.ensure_connection()
+        ingredient_index.all()
+        get_tag_ids()
+        for url_name, viewset in CATALOGS:
+            prime_catalog(url_name, viewset)
+    finally:
+        connections.close_all()
@@ -0,0 +1,40 @@
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+
+from .pool import close_pools, get_pool
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+    pool = None
+
+    def get_new_connection(self, conn_params):
+        if self.alias == NO_DB_ALIAS:
+            self.pool = None
+            return super().get_new_connection(conn_params)
+        self.pool = get_pool(
+            self.alias, conn_params,
+            lambda: base.DatabaseWrapper.get_new_connection(
+                self, conn_params
+            ),
+            self.settings_dict.get('POOL', {})
+        )
+        connection = self.pool.checkout()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.pool is None:
+            return super()._close()
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.release(self.connection)
@@ -0,0 +1,182 @@
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import Error, OperationalError, extensions
+
+DEFAULT_POOL_OPTIONS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 60 * 30,
+    'HEALTH_CHECK_AFTER': 10,
+}
+STAT_NAMES = (
+    'created', 'reused', 'expired', 'health_check_failures', 'discarded',
+    'waits', 'timeouts',
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+
+    def __init__(self, connect, options):
+        options = {**DEFAULT_POOL_OPTIONS, **options}
+        self.connect = connect
+        self.max_size = options['MAX_SIZE']
+        self.timeout = options['TIMEOUT']
+        self.max_lifetime = options['MAX_LIFETIME']
+        self.health_check_after = options['HEALTH_CHECK_AFTER']
+        self.pid = os.getpid()
+        self.condition = threading.Condition()
+        self.idle = deque()
+        self.created_at = {}
+        self.size = 0
+        self.stats = dict.fromkeys(STAT_NAMES, 0)
+
+    def count(self, name):
+        with self.condition:
+            self.stats[name] += 1
+
+    def expired(self, connection):
+        return (
+            time.monotonic() - self.created_at.get(connection, 0)
+            > self.max_lifetime
+        )
+
+    def is_healthy(self, connection, released_at):
+        if connection.closed:
+            return False
+        if time.monotonic() - released_at < self.health_check_after:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if (connection.get_transaction_status()
+                    != extensions.TRANSACTION_STATUS_IDLE):
+                connection.rollback()
+        except Error:
+            return False
+        return True
+
+    def take(self):
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        with self.condition:
+            while True:
+                if self.idle:
+                    return self.idle.pop()
+                if self.size < self.max_size:
+                    self.size += 1
+                    return None, None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise OperationalError(
+                        f'connection pool exhausted ({self.max_size} '
+                        f'connections in use for {self.timeout} s)'
+                    )
+                if not waited:
+                    self.stats['waits'] += 1
+                    waited = True
+                self.condition.wait(remaining)
+
+    def checkout(self):
+        while True:
+            connection, released_at = self.take()
+            if connection is None:
+                break
+            if self.expired(connection):
+                self.count('expired')
+            elif not self.is_healthy(connection, released_at):
+                self.count('health_check_failures')
+            else:
+                self.count('reused')
+                return connection
+            self.discard(connection)
+        try:
+            connection = self.connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.created_at[connection] = time.monotonic()
+            self.stats['created'] += 1
+        return connection
+
+    def release(self, connection):
+        if os.getpid() != self.pid or connection not in self.created_at:
+            connection.close()
+            return
+        usable = not connection.closed and not self.expired(connection)
+        if usable and (connection.get_transaction_status()
+                       != extensions.TRANSACTION_STATUS_IDLE):
+            try:
+                connection.rollback()
+            except Error:
+                usable = False
+        if not usable:
+            self.discard(connection)
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Error:
+            pass
+        with self.condition:
+            self.created_at.pop(connection, None)
+            self.size -= 1
+            self.stats['discarded'] += 1
+            self.condition.notify()
+
+    def close(self):
+        with self.condition:
+            idle = [connection for connection, _ in self.idle]
+            self.idle.clear()
+        for connection in idle:
+            self.discard(connection)
+
+    def get_stats(self):
+        with self.condition:
+            return {
+                'max_size': self.max_size,
+                'size': self.size,
+                'idle': len(self.idle),
+                'in_use': self.size - len(self.idle),
+                **self.stats,
+            }
+
+
+def get_pool(alias, conn_params, connect, options):
+    key = (alias, tuple(sorted(
+        (name, str(value)) for name, value in conn_params.items()
+    )))
+    pool = _pools.get(key)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None or pool.pid != os.getpid():
+                pool = _pools[key] = ConnectionPool(connect, options)
+                pool.name = f'{alias}:{conn_params.get("database")}'
+    return pool
+
+
+def close_pools():
+    for pool in list(_pools.values()):
+        if pool.pid == os.getpid():
+            pool.close()
+
+
+def get_pool_stats():
+    return {
+        pool.name: pool.get_stats()
+        for pool in list(_pools.values()) if pool.pid == os.getpid()
+    }
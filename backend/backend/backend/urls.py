@@ -16,8 +16,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from api.views import short_link
+
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path("s/", include("urlshortner.urls")),
+    path('s/<str:code>', short_link),
     path('api/', include('api.urls')),
 ]
@@ -0,0 +1,108 @@
+import math
+import os
+import time
+
+CGROUP_UNLIMITED = 2 ** 60
+
+
+def read_cgroup(*paths):
+    for path in paths:
+        try:
+            with open(path) as file:
+                return file.read().split()
+        except OSError:
+            continue
+    return None
+
+
+def get_cpu_count():
+    count = len(os.sched_getaffinity(0))
+    quota = read_cgroup('/sys/fs/cgroup/cpu.max')
+    if quota is None:
+        quota = read_cgroup('/sys/fs/cgroup/cpu/cpu.cfs_quota_us')
+        period = read_cgroup('/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+        if quota and period:
+            quota = quota + period
+    if quota and quota[0] not in ('max', '-1'):
+        count = min(count, math.ceil(int(quota[0]) / int(quota[1])))
+    return max(1, count)
+
+
+def get_memory():
+    memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    limit = read_cgroup(
+        '/sys/fs/cgroup/memory.max',
+        '/sys/fs/cgroup/memory/memory.limit_in_bytes',
+    )
+    if limit and limit[0] != 'max' and int(limit[0]) < CGROUP_UNLIMITED:
+        memory = min(memory, int(limit[0]))
+    return memory
+
+
+server_mode = os.getenv('SERVER_MODE', 'wsgi')
+cpu_count = get_cpu_count()
+image_workers = max(1, int(os.getenv('IMAGE_PROCESSING_WORKERS', 2)))
+worker_memory = (
+    int(os.getenv('GUNICORN_WORKER_MEMORY_MB', 200))
+    + image_workers * int(os.getenv('IMAGE_WORKER_MEMORY_MB', 150))
+) * 1024 ** 2
+
+bind = os.getenv('GUNICORN_BIND', '0:7000')
+workers = int(os.getenv('GUNICORN_WORKERS', 0)) or max(
+    1, min(cpu_count * 2 + 1, get_memory() // worker_memory)
+)
+threads = int(os.getenv('GUNICORN_THREADS', 0)) or min(
+    8, max(1, math.ceil(cpu_count * 4 / workers))
+)
+if server_mode == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
+    threads = 1
+elif threads > 1:
+    worker_class = 'gthread'
+else:
+    worker_class = 'sync'
+preload_app = True
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(
+    os.getenv('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+
+
+def when_ready(server):
+    from django.conf import settings
+    from django.db import connections
+
+    from backend.postgresql_pool.pool import close_pools
+
+    if (server.cfg.workers > 1 and settings.CACHES['default'][
+            'BACKEND'].endswith('LocMemCache')):
+        raise RuntimeError(
+            'LocMemCache is private to each worker, so cache invalidation '
+            'would not reach the other workers. Configure a shared '
+            'CACHE_BACKEND or set GUNICORN_WORKERS=1.'
+        )
+    connections.close_all()
+    close_pools()
+    server.log.info(
+        'Serving %s with %s %s workers, %s threads each',
+        server_mode, workers, worker_class, threads
+    )
+
+
+def post_worker_init(worker):
+    from api.warmup import warm_up
+
+    start = time.perf_counter()
+    try:
+        warm_up()
+    except Exception:
+        worker.log.exception('Worker %s warm-up failed', worker.pid)
+        return
+    worker.log.info(
+        'Worker %s warmed up in %.1f ms',
+        worker.pid, (time.perf_counter() - start) * 1000
+    )
@@ -1,7 +1,8 @@
 from django.contrib import admin
 
 from .models import (
-    Ingredient, Tag, Recipe, IngredientRecipie, Favorite, ShoppingCart
+    Ingredient, Tag, Recipe, IngredientRecipie, Favorite, ShoppingCart,
+    ShoppingListItem
 )
 
 
@@ -54,3 +55,9 @@ class FavoriteAdmin(admin.ModelAdmin):
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
     search_fields = ('user', 'recipe')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
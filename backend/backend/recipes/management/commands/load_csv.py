@@ -1,11 +1,17 @@
 import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
 
 from django.apps import apps
-from django.core.management import BaseCommand
-from django.shortcuts import get_object_or_404
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.management import BaseCommand, CommandError
+from django.db import models, transaction
 
+from api.caching import bump_catalog_version
 
-MODELS_FIELDS = {}
+DEFAULT_BATCH_SIZE = 1000
 
 
 class Command(BaseCommand):
@@ -19,16 +25,149 @@ class Command(BaseCommand):
             type=str,
             help="django app name that the model is connected to"
         )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="rows per bulk insert"
+        )
+        parser.add_argument(
+            '--on_conflict',
+            choices=('ignore', 'update'),
+            default='ignore',
+            help="what to do with rows whose natural key already exists"
+        )
+        parser.add_argument(
+            '--natural_key',
+            type=str,
+            help="comma separated fields identifying a row, "
+                 "all file columns by default"
+        )
+
+    def read_rows(self, file):
+        if file.name.endswith('.json'):
+            yield from json.load(file)
+        else:
+            yield from csv.DictReader(file, delimiter=',')
+
+    def resolve_foreign_keys(self, model, rows, id_maps):
+        for field in model._meta.get_fields():
+            if not isinstance(field, models.ForeignKey):
+                continue
+            if field.name not in rows[0]:
+                continue
+            related = field.related_model
+            known = id_maps.setdefault(field.name, set())
+            for row in rows:
+                row[field.name] = self.normalize(
+                    model, field.name, row[field.name]
+                )
+            missing = {row[field.name] for row in rows} - known
+            if missing:
+                known.update(related.objects.filter(
+                    pk__in=missing
+                ).values_list('pk', flat=True))
+            for row in rows:
+                value = row.pop(field.name)
+                if value not in known:
+                    raise CommandError(
+                        f'{related.__name__} with pk={value} does not exist'
+                    )
+                row[field.attname] = value
+
+    def normalize(self, model, name, value):
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise CommandError(f'{model.__name__} has no field {name}')
+        if isinstance(field, models.ForeignKey):
+            field = field.target_field
+        if isinstance(value, str):
+            value = ' '.join(value.split())
+            if isinstance(field, models.IntegerField):
+                try:
+                    number = Decimal(value)
+                except InvalidOperation:
+                    number = None
+                if number is not None and number == number.to_integral():
+                    value = int(number)
+        try:
+            return field.to_python(value)
+        except ValidationError as error:
+            raise CommandError(f'{name}={value!r}: {error.messages[0]}')
+
+    def load_batch(self, model, rows, natural_key, on_conflict):
+        batch = {}
+        for row in rows:
+            for name, value in row.items():
+                row[name] = self.normalize(model, name, value)
+            batch[tuple(row[field] for field in natural_key)] = row
+        existing = {}
+        for obj in model.objects.filter(**{
+            f'{field}__in': {key[i] for key in batch}
+            for i, field in enumerate(natural_key)
+        }):
+            key = tuple(
+                self.normalize(model, field, getattr(obj, field))
+                for field in natural_key
+            )
+            if key in batch:
+                existing[key] = obj
+        model.objects.bulk_create(
+            [model(**row) for key, row in batch.items()
+             if key not in existing]
+        )
+        created = len(batch) - len(existing)
+        if on_conflict == 'ignore' or not existing:
+            return created, 0
+        fields = set()
+        for key, obj in existing.items():
+            for field, value in batch[key].items():
+                setattr(obj, field, value)
+                fields.add(field)
+        fields.difference_update(natural_key)
+        if fields:
+            model.objects.bulk_update(existing.values(), fields)
+        return created, len(existing)
 
     def handle(self, *args, **options):
         file_path = options['path']
         model = apps.get_model(options['app_name'], options['model_name'])
-        with open(file_path, 'rt', encoding='utf-8') as csv_file:
-            reader = csv.DictReader(csv_file, delimiter=',')
-            for row in reader:
-                for field, value in row.items():
-                    if field in MODELS_FIELDS.keys():
-                        row[field] = get_object_or_404(
-                            MODELS_FIELDS[field], pk=value
-                        )
-                model.objects.create(**row)
+        natural_key = None
+        if options['natural_key']:
+            natural_key = [
+                model._meta.get_field(field).attname
+                for field in options['natural_key'].split(',')
+            ]
+        start = time.perf_counter()
+        total = created = updated = 0
+        id_maps = {}
+        with open(file_path, 'rt', encoding='utf-8') as file:
+            rows = self.read_rows(file)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                self.resolve_foreign_keys(model, batch, id_maps)
+                if natural_key is None:
+                    natural_key = list(batch[0])
+                if (options['on_conflict'] == 'update'
+                        and not set(batch[0]) - set(natural_key)):
+                    raise CommandError(
+                        '--on_conflict update needs columns outside the '
+                        'natural key, pass a narrower --natural_key'
+                    )
+                with transaction.atomic():
+                    batch_created, batch_updated = self.load_batch(
+                        model, batch, natural_key, options['on_conflict']
+                    )
+                total += len(batch)
+                created += batch_created
+                updated += batch_updated
+        bump_catalog_version()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f'{total} rows read, {created} created, {updated} updated, '
+            f'{total - created - updated} skipped in {elapsed:.2f} s '
+            f'({total / elapsed if elapsed else 0:.0f} rows/s)'
+        )
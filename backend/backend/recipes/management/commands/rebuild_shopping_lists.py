@@ -0,0 +1,36 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import IngredientRecipie, ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuilding shopping lists from the contents of users carts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help="rebuild the shopping list of this user id only"
+        )
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        items = ShoppingListItem.objects.all()
+        carts = {'recipe__carts__isnull': False}
+        if options['user']:
+            items = items.filter(user_id=options['user'])
+            carts = {'recipe__carts__user_id': options['user']}
+        items.delete()
+        totals = IngredientRecipie.objects.filter(**carts).values(
+            'recipe__carts__user', 'ingredient'
+        ).annotate(total=Sum('amount')).order_by()
+        created = ShoppingListItem.objects.bulk_create(
+            ShoppingListItem(
+                user_id=row['recipe__carts__user'],
+                ingredient_id=row['ingredient'],
+                amount=row['total']
+            ) for row in totals
+        )
+        self.stdout.write(f'Shopping list rows rebuilt: {len(created)}')